@@ -0,0 +1,32 @@
+"""
+  Ahead of time compilation of the hex signature union-find of paul_cube_bandaged_graph.py
+
+  It builds the paul_cube_native extension next to this file with numba. When the
+  extension is present it is used instead of the python version of the function.
+  numba is needed only to build the extension, not to run paul_cube_bandaged_graph.py
+
+  Usage:
+      python3 compile_native.py
+"""
+
+import os
+import sys
+from numba.pycc import CC
+
+# don't load an extension built previously, the python versions of the functions are needed
+sys.modules["paul_cube_native"] = None
+import paul_cube_bandaged_graph
+
+"""
+The signature of label_connected_cubies, the ahead of time compilation needs explicit types
+"""
+LABEL_CONNECTED_CUBIES_SIGNATURE = "int32[:](int64, int32[:, :], int64)"
+
+if __name__ == "__main__":
+    cc = CC("paul_cube_native")
+    cc.output_dir = os.path.dirname(os.path.abspath(__file__))
+    cc.export(
+        "label_connected_cubies",
+        LABEL_CONNECTED_CUBIES_SIGNATURE,
+    )(paul_cube_bandaged_graph.label_connected_cubies)
+    cc.compile()
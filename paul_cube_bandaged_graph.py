@@ -13,19 +13,32 @@ import os
 import sys
 import csv
 import re
-import pydot
+import json
+import pickle
+import hashlib
 import numpy as np
 import tempfile
 import itertools
 import collections
-import networkx as nx
 import glob
 import shutil
 import argparse
-import svgwrite
+import concurrent.futures
+import contextlib
+import zipfile
+
+# pydot, networkx and svgwrite are imported by the drawing functions which use them,
+# so the runs which skip most of the cubes don't pay for their import
 
 import bce.core
 
+try:
+    # optional extension built by compile_native.py
+    # numba itself is not imported, its import costs more than it saves on the decoding
+    import paul_cube_native
+except ImportError:
+    paul_cube_native = None
+
 
 """
 The configuration of the graph output
@@ -36,8 +49,21 @@ MAX_NUMBER_OF_NODES_PER_CATEGORY = {
     "label_only": 0,
     "circle": 2500,
 }
+"""
+The node categories, ordered by importance (from the highest degree nodes to the lowest)
+"""
+NODE_CATEGORIES_NAMES = ["cube", "circle_with_label", "label_only", "circle", "none"]
 SHOW_EDGE_LABELS_MAX = 300
 SHOW_EDGE_ARROWS_MAX = 2000
+# the widths of the "circle" nodes; the higher degree nodes are drawn larger
+BASE_CIRCLE_WIDTH = 0.2
+CIRCLE_WIDTHS = tuple(BASE_CIRCLE_WIDTH * pow(0.5, k) for k in range(5))
+# the graphs up to this number of nodes can be drawn together with the legend in a single graphviz pass (see draw_cube_graph)
+SINGLE_PASS_LEGEND_DRAW_MAX_NODES = 10000
+# the maximum number of calls per process which are submitted to run_in_processes and are not finished yet
+MAX_PENDING_CALLS_PER_PROCESS = 2
+# the read buffer size of the csv files
+CSV_READ_BUFFER_SIZE = 1 << 20
 
 """
 face color scheme (it is also used to draw the face moves in the graph)
@@ -52,10 +78,52 @@ FACE_COLORS = {
 }
 UNKNOWN_FACE_EDGE_COLOR = "#8020a0"
 
+"""
+separators between the numbers of the cubes in the list format
+"""
+CUBE_SIGNATURE_SEPARATORS_RE = re.compile(r"[.,; ]+")
+
+"""
+the statements of the graphviz "dot" output format and the pos attribute
+graphviz writes a tab between a node name and its attributes, the edges have " -> " after the first node name
+"""
+DOT_OUTPUT_STATEMENT_RE = re.compile(
+    r'^\t+("(?:[^"\\]|\\.)*"|[\w.]+)( -> |\t\[|\s*\[|\s*\{|;)', re.MULTILINE
+)
+DOT_OUTPUT_POS_ATTRIBUTE_RE = re.compile(r'[\s\[,]pos="([^"]*)"')
+
+"""
+default values of the command line arguments
+"""
+DEFAULT_OUTPUT_DIRECTORY = "."
+DEFAULT_FILE_FORMAT = "png"
+DEFAULT_CUBE_DRAW_PROJECTION = "cube_map"
+
 # TODO: add better passing of the configuration from the command line
 # to the lower level functions (like draw_svg_cube for the "cube_draw_projection")
 
 
+def estimate_N_bounds(cube):
+    """
+    Cheap bounds of the number of nodes of the cube graph, without exploring the cube
+
+    Args:
+       cube: the bandaged cube in array[27] format
+    Returns:
+       tuple of (min_N, max_N), where max_N is None if it is unknown
+       A cube which can't turn any of its faces has a single node
+    """
+    cube_np = np.asarray(cube).reshape((3, 3, 3))
+    for axis in range(3):
+        layers = np.moveaxis(cube_np, axis, 0)
+        middle_layer = layers[1][layers[1] != 0]
+        for face_layer in (layers[0], layers[2]):
+            # the face can turn if no bandage connects it to the middle layer
+            if not np.intersect1d(face_layer[face_layer != 0], middle_layer).size:
+                return (1, None)
+    return (1, 1)
+
+
 def explore_cube(cube):
     """
     A wrapper to bce.explore of the cube
@@ -73,6 +141,62 @@ def explore_cube(cube):
     return result
 
 
+def explore_cube_cached(cube, cache_directory=None):
+    """
+    Explore the cube using optionally a disk cache
+    (there is no memory cache, the explored graphs can be big and a cube is rarely explored twice in a run)
+
+    Args:
+       cube: the bandaged cube as tuple[27]
+       cache_directory: if set, the explored cubes are also saved to this directory and reused on the next runs
+    Returns:
+       tuples of (nodes, edges, labels, i2c) (see explore_cube)
+    """
+    cache_filename = None
+    if cache_directory:
+        cache_filename = os.path.join(
+            cache_directory, hashlib.sha1(repr(cube).encode()).hexdigest() + ".pickle"
+        )
+        if os.path.exists(cache_filename):
+            with open(cache_filename, "rb") as f:
+                return pickle.load(f)
+
+    result = explore_cube(list(cube))
+
+    if cache_filename:
+        # the file is renamed after it is written, because several processes can use the same cache
+        os.makedirs(cache_directory, exist_ok=True)
+        tmp_cache_filename = "{}.{}.tmp".format(cache_filename, os.getpid())
+        with open(tmp_cache_filename, "wb") as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_cache_filename, cache_filename)
+    return result
+
+
+def get_runs(values):
+    """
+    Find the runs of consecutive true values
+
+    Args:
+        values: a list of booleans
+    Returns:
+        a list of (start, length) pairs for every run of true values
+        Example:
+        for [True, True, False, True] it returns [(0, 2), (3, 1)]
+    """
+    runs = []
+    start = None
+    for k, value in enumerate(values):
+        if value and start is None:
+            start = k
+        elif not value and start is not None:
+            runs.append((start, k - start))
+            start = None
+    if start is not None:
+        runs.append((start, len(values) - start))
+    return runs
+
+
 def draw_svg_cube(
     svg_filename,
     cube_order,
@@ -81,6 +205,7 @@ def draw_svg_cube(
     color_mode="white",
     label=None,
     cube_draw_projection="cube_map",
+    pretty=False,
 ):
     """
     Draw a bandaged NxNxN cube in svg format.
@@ -97,7 +222,10 @@ def draw_svg_cube(
                 "full"   - the whole faces are drawn with the face color
          label: cube label
          cube_draw_projection: the projection of the cube drawing ("cube_map", "isometric")
+         pretty: if the svg file is indented (the intermediate svg files are read only by graphviz, so they are not indented by default)
     """
+    import svgwrite
+
     global FACE_COLORS
     CUBE_MODES = {
         "cube_map": {
@@ -134,7 +262,8 @@ def draw_svg_cube(
         },
     }
     current_projection = CUBE_MODES[cube_draw_projection]
-    dwg = svgwrite.Drawing(svg_filename, profile="tiny")
+    # the attributes are not validated (debug=False), the validation takes more than half of the drawing time
+    dwg = svgwrite.Drawing(svg_filename, profile="tiny", debug=False)
 
     stroke_width = 0.05 * cube_order
     g1 = svgwrite.container.Group(
@@ -142,7 +271,10 @@ def draw_svg_cube(
             image_size, stroke_width * 0.25 / cube_order
         )
     )
-    cube_np = np.reshape(cube, (cube_order, cube_order, cube_order))
+    # the cube array is in C order: cube[x * cube_order * cube_order + y * cube_order + z]
+    cube_np = np.asarray(cube, dtype=np.int32).reshape(
+        (cube_order, cube_order, cube_order)
+    )
 
     faces = {
         "L": cube_np[:, :, 0],
@@ -154,7 +286,6 @@ def draw_svg_cube(
     }
     # draw the faces
     for face_name, face in faces.items():
-        face = faces[face_name]
         transforms = current_projection["transforms"]
         grp = svgwrite.container.Group(
             transform=transforms[face_name] + " scale({})".format(1.0 / cube_order)
@@ -173,52 +304,52 @@ def draw_svg_cube(
             )
 
         # draw face center colors for odd size cubes
+        # (the center square and the squares bandaged to it)
         if cube_order % 2 == 1 and color_mode == "center":
             center_pos = (cube_order - 1) // 2
-            center_group = face[center_pos][center_pos]
-        else:
-            center_group = -1
-            center_pos = -1
-        for y in range(0, cube_order):
-            for x in range(0, cube_order):
-                if (center_group != 0 and face[y][x] == center_group) or (
-                    x == center_pos and y == center_pos
-                ):
-                    grp.add(
-                        dwg.rect(
-                            (x, y),
-                            (1, 1),
-                            fill=FACE_COLORS[face_name],
-                            stroke_width=stroke_width / 2.0,
-                            stroke=FACE_COLORS[face_name],
-                        )
+            center_group = face[center_pos, center_pos]
+            fill_mask = (face == center_group) & (center_group != 0)
+            fill_mask[center_pos, center_pos] = True
+            for y, x in np.argwhere(fill_mask).tolist():
+                grp.add(
+                    dwg.rect(
+                        (x, y),
+                        (1, 1),
+                        fill=FACE_COLORS[face_name],
+                        stroke_width=stroke_width / 2.0,
+                        stroke=FACE_COLORS[face_name],
                     )
+                )
 
         # draw the square separations (for non bandage squares)
-        for y in range(0, cube_order):
-            for x in range(0, cube_order):
-                if (x < (cube_order - 1)) and (
-                    face[y][x + 1] == 0 or (face[y][x + 1] != face[y][x])
-                ):
-                    grp.add(
-                        dwg.line(
-                            (x + 1, y),
-                            (x + 1, y + 1),
-                            stroke="black",
-                            stroke_width=stroke_width,
-                        )
+        # the adjacent separations on the same line are drawn as a single path
+        # vertical_separations[k - 1][y] is the separation at the left of the square (x=k, y)
+        # horizontal_separations[k - 1][x] is the separation at the top of the square (x, y=k)
+        vertical_separations = (
+            (face[:, 1:] == 0) | (face[:, 1:] != face[:, :-1])
+        ).T.tolist()
+        horizontal_separations = (
+            (face[1:, :] == 0) | (face[1:, :] != face[:-1, :])
+        ).tolist()
+        for k in range(1, cube_order):
+            for start, length in get_runs(vertical_separations[k - 1]):
+                grp.add(
+                    dwg.path(
+                        d="M {} {} v {}".format(k, start, length),
+                        fill="none",
+                        stroke="black",
+                        stroke_width=stroke_width,
                     )
-                if (y < (cube_order - 1)) and (
-                    face[y + 1][x] == 0 or (face[y + 1][x] != face[y][x])
-                ):
-                    grp.add(
-                        dwg.line(
-                            (x, y + 1),
-                            (x + 1, y + 1),
-                            stroke="black",
-                            stroke_width=stroke_width,
-                        )
+                )
+            for start, length in get_runs(horizontal_separations[k - 1]):
+                grp.add(
+                    dwg.path(
+                        d="M {} {} h {}".format(start, k, length),
+                        fill="none",
+                        stroke="black",
+                        stroke_width=stroke_width,
                     )
+                )
 
         # draw face edges
         grp.add(
@@ -257,7 +388,7 @@ def draw_svg_cube(
     label_pos_y = current_projection["label_pos_y"]
     dwg["height"] = str(image_size * current_projection["image_size_y_multiplier"])
     dwg["width"] = str(image_size * current_projection["image_size_x_multiplier"])
-    dwg.save(pretty=True)
+    dwg.save(pretty=pretty)
 
 
 def generate_hex_signature_connections():
@@ -287,6 +418,76 @@ def generate_hex_signature_connections():
     return conn
 
 
+"""
+The hex signature connections are the same for every cube, so they are generated only once
+HEX_SIGNATURE_CONNECTIONS_NP is the numpy array[54,2,3] version of the same connections
+HEX_SIGNATURE_CONNECTIONS_FLAT is the numpy array[54,2] of the cubie indices (x*9+y*3+z) of the connections
+HEX_SIGNATURE_CONNECTIONS_FLAT_LIST is the list version of it, the plain python union-find is faster on lists
+"""
+HEX_SIGNATURE_CONNECTIONS = generate_hex_signature_connections()
+HEX_SIGNATURE_CONNECTIONS_NP = np.array(HEX_SIGNATURE_CONNECTIONS, dtype=np.int32)
+HEX_SIGNATURE_CONNECTIONS_FLAT = HEX_SIGNATURE_CONNECTIONS_NP @ np.array(
+    [9, 3, 1], dtype=np.int32
+)
+HEX_SIGNATURE_CONNECTIONS_FLAT_LIST = HEX_SIGNATURE_CONNECTIONS_FLAT.tolist()
+
+
+def label_connected_cubies(signature_int, connections, n_cubies):
+    """
+    Label the groups of connected cubies of a signature using union-find
+    The ahead of time compiled version from paul_cube_native is used if it was built
+
+    Args:
+        signature_int: the signature as integer, every bit set means that its connection is present
+        connections: an array[n,2] (or a list of pairs) of the indices of the cubies of every connection, the first connection is the most significant bit
+        n_cubies: the total number of cubies
+
+    Returns:
+        an array[n_cubies] with 0 for the cubies without connections and the group number (starting from 1) for the connected cubies
+        The groups are numbered in the order of their first cubie
+    """
+    # the root of every group is its smallest cubie index
+    parent = list(range(n_cubies))
+    connected = [False] * n_cubies
+    n_connections = len(connections)
+    for k in range(n_connections):
+        if not (signature_int >> (n_connections - 1 - k)) & 1:
+            continue
+        a = connections[k][0]
+        b = connections[k][1]
+        connected[a] = True
+        connected[b] = True
+        while parent[a] != a:
+            parent[a] = parent[parent[a]]
+            a = parent[a]
+        while parent[b] != b:
+            parent[b] = parent[parent[b]]
+            b = parent[b]
+        if a < b:
+            parent[b] = a
+        elif b < a:
+            parent[a] = b
+
+    cube = np.zeros(n_cubies, dtype=np.int32)
+    groups = [0] * n_cubies
+    n_groups = 0
+    for k in range(n_cubies):
+        if not connected[k]:
+            continue
+        root = k
+        while parent[root] != root:
+            root = parent[root]
+        if groups[root] == 0:
+            n_groups += 1
+            groups[root] = n_groups
+        cube[k] = groups[root]
+    return cube
+
+
+if paul_cube_native is not None:
+    label_connected_cubies = paul_cube_native.label_connected_cubies
+
+
 def convert_hex_signature_to_bandage_array(signature_hex):
     """
       Convert hex signature to an array[27] bandage cube
@@ -299,12 +500,12 @@ def convert_hex_signature_to_bandage_array(signature_hex):
 
       Example: 
           for signature_hex="33EC01800846" it returns
-          [ 3, 4, 5, 
-           6, 1, 2, 
-          7, 1, 2, 
-            3, 4, 5, 
-           6, 1, 8, 
-          7, 1, 8, 
+          [ 1, 2, 3, 
+           4, 5, 6, 
+          7, 5, 6, 
+            1, 2, 3, 
+           4, 5, 8, 
+          7, 5, 8, 
             9, 9, 0, 
            10,10,11, 
           12,12,11]
@@ -312,26 +513,16 @@ def convert_hex_signature_to_bandage_array(signature_hex):
     cube_int = int(signature_hex, 16)
     CUBE_N_CONNECTIONS = 54
 
-    signature_text_bin = format(cube_int, "0{}b".format(CUBE_N_CONNECTIONS))
-    signature_bin = [m == "1" for m in signature_text_bin]
-    if len(signature_bin) > CUBE_N_CONNECTIONS:
+    if cube_int < 0 or cube_int >> CUBE_N_CONNECTIONS:
         raise ValueError("Invalid signature - too large")
 
-    connections = [
-        m
-        for k, m in enumerate(generate_hex_signature_connections())
-        if signature_bin[k]
-    ]
-
-    connections_graph = nx.Graph(connections)
-    subgraphs = (connections_graph.subgraph(m).copy() for m in nx.connected_components(connections_graph))
-
-    cube = np.zeros((3, 3, 3), dtype=np.int32, order="c")
-    for k, sg in enumerate(subgraphs):
-        for (x, y, z) in sg.nodes():
-            cube[x, y, z] = k + 1
+    if paul_cube_native is None:
+        connections = HEX_SIGNATURE_CONNECTIONS_FLAT_LIST
+    else:
+        connections = HEX_SIGNATURE_CONNECTIONS_FLAT
+    cube = label_connected_cubies(cube_int, connections, 27)
 
-    cube_as_list = list(cube.ravel())
+    cube_as_list = cube.tolist()
 
     return cube_as_list
 
@@ -348,7 +539,11 @@ def convert_cube_signature_to_bandage_array(cube_text):
     "3.4.5,6.1.2,7.1.2, 3.4.5,6.1.8,7.1.8, 9.9.0,10.10.11,12.12.11"
     """
     cube_text = cube_text.strip()
-    cube_text_items = [m for m in re.split("\.|,|;| ", cube_text) if m]
+    if cube_text.isalnum():
+        # hex signature without separators (the common case), it is not split
+        return convert_hex_signature_to_bandage_array(cube_text)
+
+    cube_text_items = [m for m in CUBE_SIGNATURE_SEPARATORS_RE.split(cube_text) if m]
     cube = None
     if len(cube_text_items) == 1:
         # hex signature
@@ -372,13 +567,13 @@ def invert_tuple_list_to_dict(tuple_list):
     Returns:
       A dictionary of list
     """
-    result = {}
+    result = collections.defaultdict(list)
     for k, v in tuple_list:
-        result.setdefault(v, list()).append(k)
-    return result
+        result[v].append(k)
+    return dict(result)
 
 
-def separate_nodes_by_categories(graph, max_number_nodes_per_category):
+def separate_nodes_by_category_indices(graph, max_number_nodes_per_category):
     """
        Separates the nodes by the category using ther degree
        The categories are ordered by importance and they are:
@@ -387,53 +582,94 @@ def separate_nodes_by_categories(graph, max_number_nodes_per_category):
          - "label_only"
          - "circle
          - "none" (nodes with the lowest degrees)
-       
+
        Args:
          graph: networkx graph
          max_number_nodes_per_category: A dictionary with keys as categories names and the value of the maximum nodes allowed for that category
 
        If there are too many nodes with the same degree then the all these nodes are put in the next category. This avoid having nodes with the same degree on multiple categories.
+
+       Returns:
+         tuple of (degree_categories, nodes_degrees_inv)
+           degree_categories: an int8 array indexed by the node degree with the index of the category in NODE_CATEGORIES_NAMES (-1 if there are no nodes with that degree)
+           nodes_degrees_inv: a dictionary where the keys are the node degree and the values a list of all nodes with that degree
     """
-    node_categories_thresholds_names = [
-        "cube",
-        "circle_with_label",
-        "label_only",
-        "circle",
-    ]
+    node_categories_thresholds_names = NODE_CATEGORIES_NAMES[:-1]
 
-    node_categories_current_threshold = 0
-    node_categories_thresholds = []
+    node_categories_thresholds = np.cumsum(
+        [
+            max_number_nodes_per_category.get(node_category_priority_name, 0)
+            for node_category_priority_name in node_categories_thresholds_names
+        ]
+    )
 
-    nodes_degrees = list(nx.degree(graph))
-    for node_category_priority_name in node_categories_thresholds_names:
-        number_nodes_per_category = max_number_nodes_per_category.get(
-            node_category_priority_name, 0
-        )
-        node_categories_current_threshold += number_nodes_per_category
-        node_categories_thresholds.append(node_categories_current_threshold)
-
-    nodes_degrees_inv = invert_tuple_list_to_dict(nodes_degrees)
-    degrees_with_number_of_nodes = [(k, len(v)) for (k, v) in nodes_degrees_inv.items()]
-
-    total_nodes_sorted_by_degrees = {}
-    total_nodes_by_degree = 0
-    nodes_degree_categories = {}
-    for (degree, degree_nodes) in sorted(
-        degrees_with_number_of_nodes, key=lambda m: m[0], reverse=True
-    ):
-        total_nodes_by_degree += degree_nodes
-        category_k = len(
-            [m for m in node_categories_thresholds if m < total_nodes_by_degree]
-        )
-        try:
-            category_name = node_categories_thresholds_names[category_k]
-        except IndexError:
-            category_name = "none"
-        nodes_degree_categories[degree] = category_name
+    nodes_degrees_inv = invert_tuple_list_to_dict(graph.degree())
+    sorted_degrees = sorted(nodes_degrees_inv, reverse=True)
 
+    # the category of every degree is given by how many thresholds are below
+    # the total number of nodes with the same or higher degree
+    # (the degrees above all the thresholds get the last category, "none")
+    total_nodes_by_degree = np.cumsum(
+        [len(nodes_degrees_inv[degree]) for degree in sorted_degrees]
+    )
+    categories_k = np.searchsorted(
+        node_categories_thresholds, total_nodes_by_degree, side="left"
+    )
+
+    degree_categories = np.full(
+        sorted_degrees[0] + 1 if sorted_degrees else 0, -1, dtype=np.int8
+    )
+    degree_categories[sorted_degrees] = categories_k
+
+    return (degree_categories, nodes_degrees_inv)
+
+
+def separate_nodes_by_categories(graph, max_number_nodes_per_category):
+    """
+       Separates the nodes by the category using ther degree (see separate_nodes_by_category_indices)
+
+       Args:
+         graph: networkx graph
+         max_number_nodes_per_category: A dictionary with keys as categories names and the value of the maximum nodes allowed for that category
+
+       Returns:
+         tuple of (nodes_degree_categories, nodes_degrees_inv)
+           nodes_degree_categories: a dictionary where the keys are the node degree and the value is the category name for that degree
+           nodes_degrees_inv: a dictionary where the keys are the node degree and the values a list of all nodes with that degree
+    """
+    degree_categories, nodes_degrees_inv = separate_nodes_by_category_indices(
+        graph, max_number_nodes_per_category
+    )
+    degree_categories_list = degree_categories.tolist()
+    nodes_degree_categories = {
+        degree: NODE_CATEGORIES_NAMES[degree_categories_list[degree]]
+        for degree in sorted(nodes_degrees_inv, reverse=True)
+    }
     return (nodes_degree_categories, nodes_degrees_inv)
 
 
+def get_degree_categories_array(nodes_degree_categories):
+    """
+       Get the degree categories as an array indexed by the node degree
+
+       Args:
+         nodes_degree_categories: the int8 array from separate_nodes_by_category_indices, which is returned unchanged,
+           or the dictionary from separate_nodes_by_categories, where the keys are the node degree and the value is the category name for that degree
+
+       Returns:
+         an int8 array indexed by the node degree with the index of the category in NODE_CATEGORIES_NAMES (-1 if there are no nodes with that degree)
+    """
+    if isinstance(nodes_degree_categories, np.ndarray):
+        return nodes_degree_categories
+
+    degree_categories = np.full(
+        max(nodes_degree_categories, default=-1) + 1, -1, dtype=np.int8
+    )
+    for degree, category_name in nodes_degree_categories.items():
+        degree_categories[degree] = NODE_CATEGORIES_NAMES.index(category_name)
+    return degree_categories
+
+
 def process_nodes(
     graph,
     i2c,
@@ -449,7 +685,7 @@ def process_nodes(
            graph: the networkx graph (used for input and output)
            i2c: the dictionary with the cube representation where the key is the node number and the value is the cube array
            svg_filename_prefix: the file prefix of the generated SVG files
-           nodes_degree_categories: a dictionary where the keys are the node degree and the value is the category name for that degree
+           nodes_degree_categories: the int8 array of the degree categories (see separate_nodes_by_category_indices), or the dictionary from separate_nodes_by_categories
            nodes_degrees_inv: a dictionary where the keys are the node degree and the values a list of all nodes with that degree
            cube_draw_projection: the cube projection for drawing
 
@@ -458,14 +694,18 @@ def process_nodes(
 
     """
 
-    circle_degree_categories_values = sorted(
-        [k for (k, v) in nodes_degree_categories.items() if v == "circle"], reverse=True
-    )
-    circle_degree_k = {v: k for k, v in enumerate(circle_degree_categories_values)}
+    degree_categories = get_degree_categories_array(nodes_degree_categories)
+    circle_k = NODE_CATEGORIES_NAMES.index("circle")
+    circle_degree_categories_values = np.nonzero(degree_categories == circle_k)[0]
+    circle_degree_k = {
+        v: k for k, v in enumerate(circle_degree_categories_values[::-1].tolist())
+    }
+    degree_categories_list = degree_categories.tolist()
     full_cube_draw_node_list = []
-    for degree, degree_category in sorted(
-        nodes_degree_categories.items(), key=lambda m: m[0], reverse=True
-    ):
+    nodes_with_new_attributes = {}
+    # process the degrees from the highest to the lowest
+    for degree in np.nonzero(degree_categories >= 0)[0][::-1].tolist():
+        degree_category = NODE_CATEGORIES_NAMES[degree_categories_list[degree]]
         node_list = nodes_degrees_inv[degree]
 
         new_attributes = {}
@@ -494,17 +734,15 @@ def process_nodes(
             new_attributes["label"] = ""
             new_attributes["fixedsize"] = "true"
 
-            BASE_CIRCLE_WIDTH = 0.2
-            cdk = min(circle_degree_k[degree], 4)
-            width = BASE_CIRCLE_WIDTH * pow(0.5, cdk)
-            new_attributes["width"] = "{}".format(width)
+            cdk = min(circle_degree_k[degree], len(CIRCLE_WIDTHS) - 1)
+            new_attributes["width"] = f"{CIRCLE_WIDTHS[cdk]}"
         else:
             new_attributes["width"] = "0.03"
             new_attributes["shape"] = "point"
             new_attributes["color"] = "#00000080"
 
-        nodes_with_new_attributes = {k: new_attributes for k in node_list}
-        nx.set_node_attributes(graph, nodes_with_new_attributes)
+        for k in node_list:
+            nodes_with_new_attributes[k] = new_attributes
 
     # draw cubes svg
     for k_node, image_size in full_cube_draw_node_list:
@@ -518,7 +756,15 @@ def process_nodes(
             color_mode="center",
             cube_draw_projection=cube_draw_projection,
         )
-        nx.set_node_attributes(graph, {k_node: {"image": svg_filename}})
+        nodes_with_new_attributes[k_node] = {
+            **nodes_with_new_attributes[k_node],
+            "image": svg_filename,
+        }
+
+    # update the node attribute dictionaries directly (the nodes share the same new_attributes dictionary)
+    graph_nodes = graph.nodes
+    for k, new_attributes in nodes_with_new_attributes.items():
+        graph_nodes[k].update(new_attributes)
 
 
 def process_edges(graph, edge_labels, show_labels=True, show_arrows=True):
@@ -533,6 +779,8 @@ def process_edges(graph, edge_labels, show_labels=True, show_arrows=True):
        show_arrows: if the arrows of the edges is displayed
 
     """
+    import networkx as nx
+
     labels_inv = invert_tuple_list_to_dict(edge_labels.items())
     faces_moves_color_map = FACE_COLORS
 
@@ -568,13 +816,14 @@ def draw_legend(
     Args:
       dot_graph: pydot graph (used for output)
       svg_filename_prefix:  the file prefix of the generated SVG files
-      nodes_degree_categories: a dictionary where the keys are the node degree and the value is the category name for that degree
+      nodes_degree_categories: the int8 array of the degree categories (see separate_nodes_by_category_indices), or the dictionary from separate_nodes_by_categories
       nodes_degrees_inv: a dictionary where the keys are the node degree and the values a list of all nodes with that degree
       i2c: the dictionary with the cube representation where the key is the node number and the value is the cube array
       cube_draw_projection: the cube projection for drawing
 
     Returns: None
     """
+    import pydot
 
     LEGEND_CONFIG = {"cube_index_rows": 8, "max_allowed_index_size": 200}
 
@@ -582,9 +831,10 @@ def draw_legend(
 
     # draw index
     all_nodes_for_index = []
-    for node_degree, node_category in nodes_degree_categories.items():
-        if node_category == "circle_with_label":
-            all_nodes_for_index += nodes_degrees_inv[node_degree]
+    degree_categories = get_degree_categories_array(nodes_degree_categories)
+    circle_with_label_k = NODE_CATEGORIES_NAMES.index("circle_with_label")
+    for node_degree in np.nonzero(degree_categories == circle_with_label_k)[0].tolist():
+        all_nodes_for_index += nodes_degrees_inv[node_degree]
     all_nodes_for_index = sorted(all_nodes_for_index)
     image_size = 80
 
@@ -600,7 +850,7 @@ def draw_legend(
 
         html_index_table = ["<table color='grey'>"]
         for index_node_row in index_nodes_rows:
-            html_index_table += ["<tr>"]
+            html_index_table.append("<tr>")
             for index_node in index_node_row:
                 if index_node is None:
                     continue
@@ -615,14 +865,14 @@ def draw_legend(
                     label=str(index_node),
                     cube_draw_projection=cube_draw_projection,
                 )
-                html_index_table += [
+                html_index_table.append(
                     "<td><img src='{}'/></td>".format(index_node_filename)
-                ]
-            html_index_table += ["</tr>"]
+                )
+            html_index_table.append("</tr>")
 
-        html_index_table += ["</table>"]
+        html_index_table.append("</table>")
 
-        html_index_table = " ".join(html_index_table)
+        html_index_table = "".join(html_index_table)
         index_node = pydot.Node(
             "index", shape="none", label="< {} >".format(html_index_table), rank="max"
         )
@@ -650,6 +900,113 @@ def draw_legend(
         dot_graph.add_edge(pydot.Edge(index_node, start_node, style="invis"))
 
 
+def get_dot_graph_nodes(dot_graph):
+    """
+    Get all the nodes of a pydot graph, including the nodes of its subgraphs
+
+    Args:
+        dot_graph: pydot graph
+    Returns:
+        a list of pydot nodes
+    """
+    nodes = list(dot_graph.get_nodes())
+    for subgraph in dot_graph.get_subgraphs():
+        nodes += get_dot_graph_nodes(subgraph)
+    return nodes
+
+
+def get_dot_output_node_positions(dot_data):
+    """
+    Get the node positions from the graphviz "dot" format output, without parsing the whole graph
+    (the pydot parser is very slow on the large graphs)
+
+    Args:
+        dot_data: the text of the graphviz output in the "dot" format
+    Returns:
+        a dictionary where the keys are the node names and the values are the "pos" attributes (in points)
+    """
+    positions = {}
+    statements = list(DOT_OUTPUT_STATEMENT_RE.finditer(dot_data))
+    for statement, next_statement in itertools.zip_longest(statements, statements[1:]):
+        # only the node statements with attributes, the edges also have a pos attribute
+        if statement.group(2) != "\t[":
+            continue
+        end = next_statement.start() if next_statement else len(dot_data)
+        pos = DOT_OUTPUT_POS_ATTRIBUTE_RE.search(dot_data, statement.end() - 1, end)
+        if pos:
+            positions[statement.group(1).strip('"')] = pos.group(1)
+    return positions
+
+
+def write_dot_graph(
+    dot_graph, output_filename, output_format, layout_cache_filename=None
+):
+    """
+    Write the pydot graph, optionally reusing the node positions from a previous layout
+
+    Args:
+        dot_graph: pydot graph (its node positions and layout are modified if the layout cache is used)
+        output_filename: the output file
+        output_format: the graphviz output format (example: "png:cairo")
+        layout_cache_filename: if set, the json file where the node positions are kept.
+            If the file exists and has the positions for all the nodes, the nodes are pinned to these positions and graphviz only renders the graph,
+            otherwise the graph is laid out and rendered and the positions are saved to this file (in the same graphviz run)
+    """
+    if not layout_cache_filename:
+        dot_graph.write(output_filename, format=output_format)
+        return
+
+    dot_graph_nodes = [
+        m
+        for m in get_dot_graph_nodes(dot_graph)
+        if m.get_name() not in ("node", "edge", "graph")
+    ]
+    node_names = [m.get_name().strip('"') for m in dot_graph_nodes]
+
+    positions = {}
+    if os.path.exists(layout_cache_filename):
+        try:
+            with open(layout_cache_filename, "r") as f:
+                positions = json.load(f)
+        except json.JSONDecodeError:
+            print(
+                "Warning: corrupt layout cache file, the graph is laid out again:",
+                layout_cache_filename,
+            )
+            positions = {}
+
+    if not all(m in positions for m in node_names):
+        # compute the layout: a single graphviz run renders the output file and
+        # also writes the graph with the node positions in the "dot" format
+        laid_out_dot_filename = "{}.{}.dot".format(layout_cache_filename, os.getpid())
+        dot_graph.create(
+            prog=[
+                dot_graph.prog,
+                "-o" + os.path.abspath(output_filename),
+                "-Tdot",
+                "-o" + os.path.abspath(laid_out_dot_filename),
+            ],
+            format=output_format,
+        )
+        with open(laid_out_dot_filename, "r") as f:
+            positions = get_dot_output_node_positions(f.read())
+        os.remove(laid_out_dot_filename)
+        # the file is renamed after it is written, so an interrupted run doesn't leave a partial file
+        tmp_layout_cache_filename = "{}.{}.tmp".format(
+            layout_cache_filename, os.getpid()
+        )
+        with open(tmp_layout_cache_filename, "w") as f:
+            json.dump(positions, f)
+        os.replace(tmp_layout_cache_filename, layout_cache_filename)
+        return
+
+    for node, node_name in zip(dot_graph_nodes, node_names):
+        if node_name in positions:
+            node.set("pos", positions[node_name] + "!")
+    dot_graph.get_attributes()["layout"] = "neato"
+    dot_graph.write(output_filename, prog=["neato", "-n2"], format=output_format)
+
+
 def draw_cube_graph(
     explored_cube,
     cube_signature,
@@ -658,6 +1015,7 @@ def draw_cube_graph(
     skip_legend_draw,
     output_temporary_folder=None,
     cube_draw_projection=None,
+    single_pass_legend_draw=False,
 ):
     """
     Draw the cube graph and the legend
@@ -669,10 +1027,13 @@ def draw_cube_graph(
         output_filename: the file output (tested with extensions ".svg", ".png", ".pdf")
         skip_legend_draw: the the legend is not being drawn
         output_temporary_folder: if set to a string, it ouputs the temporary svg files and saves the dot files to that directory. If False no temporary files are kept
+            The graph layout is also kept in this directory and it is reused when the same cube is drawn again
         cube_draw_projection: the cube projection for drawing
+        single_pass_legend_draw: draw the legend of the graphs with up to SINGLE_PASS_LEGEND_DRAW_MAX_NODES nodes as a cluster of the graph itself, so graphviz renders everything in a single pass.
+            It is faster, but the legend is placed by sfdp (which ignores the ranks) and the image is rendered with the dpi of the graph
 
     WARNING:
-        If the legend is being drawn (skip_legend_draw is False) and the graph is very complex (like more than few tousands of nodes) the graph in the final image is will be empty
+        If the legend is being drawn (skip_legend_draw is False) and the graph is very complex (more than SINGLE_PASS_LEGEND_DRAW_MAX_NODES nodes) the graph in the final image is will be empty
         That is due to the an issue of graphviz with loading of large SVG images
         Please read more detailed comment about this issue in this function.
 
@@ -680,9 +1041,12 @@ def draw_cube_graph(
         None
 
     """
+    import pydot
+    import networkx as nx
+
     nodes, edges, labels, i2c = explored_cube
 
-    if not skip_legend_draw and len(nodes) > 10000:
+    if not skip_legend_draw and len(nodes) > SINGLE_PASS_LEGEND_DRAW_MAX_NODES:
         # more information about this issue is documented into the code below
         print(
             "Warning(bug): it is very likely to get empty graph image if skip_legend_draw is false on larger graphs. If you get this issue, as a workaround, enable skip_legend_draw"
@@ -697,14 +1061,14 @@ def draw_cube_graph(
 
     tmp_file_prefix = os.path.abspath(os.path.join(tempfile_dir.name, cube_signature))
 
-    nodes_degree_categories, nodes_degrees_inv = separate_nodes_by_categories(
+    degree_categories, nodes_degrees_inv = separate_nodes_by_category_indices(
         g, MAX_NUMBER_OF_NODES_PER_CATEGORY
     )
     process_nodes(
         g,
         i2c,
         tmp_file_prefix + "_node_",
-        nodes_degree_categories,
+        degree_categories,
         nodes_degrees_inv,
         cube_draw_projection,
     )
@@ -728,9 +1092,35 @@ def draw_cube_graph(
     dot_graph.add_edge(pydot.Edge(dot_graph_start_pointer, "0", penwidth=2, label=""))
 
     file_ext = os.path.splitext(output_filename)[1].strip(".")
+    layout_cache_filename = None
+    if output_temporary_folder:
+        layout_cache_filename = os.path.join(
+            output_temporary_folder, cube_signature + "_layout.json"
+        )
     dot_main = None
     if skip_legend_draw:
-        dot_graph.write(output_filename, format="{}:cairo".format(file_ext))
+        write_dot_graph(
+            dot_graph,
+            output_filename,
+            "{}:cairo".format(file_ext),
+            layout_cache_filename,
+        )
+    elif single_pass_legend_draw and len(nodes) <= SINGLE_PASS_LEGEND_DRAW_MAX_NODES:
+        # the legend is added as a cluster of the graph and it is laid out by sfdp together with the graph
+        draw_legend(
+            dot_graph,
+            tmp_file_prefix + "_index_",
+            degree_categories,
+            nodes_degrees_inv,
+            i2c,
+            cube_draw_projection,
+        )
+        write_dot_graph(
+            dot_graph,
+            output_filename,
+            "{}:cairo".format(file_ext),
+            layout_cache_filename,
+        )
     else:
         # Warning: very large graphs can't be embedded due to rsvg error
         # The error is "rsvg_handle_write returned an error: Error domain 1 code 1 on line 39037 column 1 of data: internal error: Huge input lookup"
@@ -742,14 +1132,14 @@ def draw_cube_graph(
         # A workaround is to skip drawing of the legend (skip_legend_draw=True)
 
         dot_graph_svg = tmp_file_prefix + "_graph.svg"
-        dot_graph.write(dot_graph_svg, format="svg:cairo")
+        write_dot_graph(dot_graph, dot_graph_svg, "svg:cairo", layout_cache_filename)
 
         # output the legend
         dot_index = pydot.Dot()
         draw_legend(
             dot_index,
             tmp_file_prefix + "_index_",
-            nodes_degree_categories,
+            degree_categories,
             nodes_degrees_inv,
             i2c,
             cube_draw_projection,
@@ -806,110 +1196,349 @@ def draw_cube_graph(
     return None
 
 
-def process_csv_file(
+def run_in_processes(function, arguments_list, result_callback=None):
+    """
+    Call a function for every tuple of arguments in parallel, using a pool of processes (one for every CPU)
+    The calls are submitted while the arguments_list is iterated, so it can be a generator
+    At most MAX_PENDING_CALLS_PER_PROCESS calls per process are pending, so the arguments_list is not read ahead
+    and the results are released as soon as they are used
+
+    Args:
+      function: the function (it must be defined at the module level)
+      arguments_list: an iterable of argument tuples
+      result_callback: if set, it is called in this process with the result of every call (in the order in which the calls finish)
+
+    If a call raises an exception, the pending calls are cancelled and the exception is raised
+    """
+    n_processes = os.cpu_count() or 1
+    max_pending_calls = MAX_PENDING_CALLS_PER_PROCESS * n_processes
+    with concurrent.futures.ProcessPoolExecutor(n_processes) as executor:
+        futures = set()
+
+        def use_finished_results():
+            finished_futures, _ = concurrent.futures.wait(
+                futures, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            futures.difference_update(finished_futures)
+            for future in finished_futures:
+                result = future.result()
+                if result_callback:
+                    result_callback(result)
+
+        try:
+            for arguments in arguments_list:
+                if len(futures) >= max_pending_calls:
+                    use_finished_results()
+                futures.add(executor.submit(function, *arguments))
+            while futures:
+                use_finished_results()
+        except BaseException:
+            executor.shutdown(cancel_futures=True)
+            raise
+
+
+def read_csv_cubes(
     csv_file_name,
     output_directory,
     file_extension="png",
     filter_by_number_of_nodes=None,
     skip_cubes_without_names=False,
-    skip_legend_draw=False,
-    cube_draw_projection=None,
+    force=False,
+    quiet=False,
 ):
     """
-      process the csv file 
-      It requires an csv file with columns named Hexa
-      Optional columns: Name, N,E
-      The meaning of the rows is:
-          Hexa - cube hex signature
-          Name - cube name
-          N - number of nodes of the graph for cube
-          E - number of edges of the graph for cube
-      
-      Args:
-        csv_file_name: csv file path
-        output_directory: the directory of output files
-        file_extension: the extension and file format (examples: "png", "svg", "pdf")
-        filter_by_number_of_nodes is a tuple of (min_nodes, max_nodes) for skipping processing of the cubes from the csv file
-        skip_cubes_without_names: skip cubes without names
-        skip_legend_draw: skip drawing of the legend for all cubes
-        cube_draw_projection: the cube projection for drawing
-    """
-    with open(csv_file_name, "r") as f:
-        csv_list = list(csv.reader(f))
-        header = {m: k for k, m in enumerate(csv_list[0])}
+    Read and filter the cubes from the csv file (the file format is described in process_csv_file)
 
-        os.makedirs(output_directory, exist_ok=True)
+    Args:
+      csv_file_name: csv file path
+      output_directory: the directory of output files
+      file_extension: the extension and file format (examples: "png", "svg", "pdf")
+      filter_by_number_of_nodes is a tuple of (min_nodes, max_nodes) for skipping processing of the cubes from the csv file
+      skip_cubes_without_names: skip cubes without names
+      force: process the cubes even if their output file exists already
+      quiet: don't print the skipped cubes
 
-        for row_k, csv_row in enumerate(csv_list[1:]):
-            cube_signature = csv_row[header["Hexa"]].strip()
-            cube_name = csv_row[header["Name"]].strip()
-            if not cube_signature:
+    Returns:
+      an iterator of tuples (cube, cube_signature, cube_name, row_k, output_filename, remaining_filter_by_number_of_nodes) for every cube which is not skipped
+      remaining_filter_by_number_of_nodes is the (min_nodes, max_nodes) filter which has to be applied after the cube is explored,
+      or None if the cube was already filtered by the csv file information
+      The cubes are not explored here, so the expensive work is done by the processes of process_csv_cube
+      Every cube signature is returned only once, even if it is repeated in the csv file
+    """
+    # every message is a single write
+    log = (lambda text: None) if quiet else sys.stdout.write
+    # the output directory is joined only once (with a trailing separator if it is not empty)
+    output_filename_prefix = os.path.join(output_directory, "")
+    # the functions called for every row are resolved only once
+    path_exists = os.path.exists
+    convert_cube_signature = convert_cube_signature_to_bandage_array
+
+    # the csv rows are read one at a time from a large buffer
+    with open(csv_file_name, "r", newline="", buffering=CSV_READ_BUFFER_SIZE) as f:
+        csv_reader = csv.reader(f)
+        header = {m: k for k, m in enumerate(next(csv_reader))}
+        # the column indices are resolved only once
+        hexa_i = header["Hexa"]
+        name_i = header.get("Name")
+        n_i = header.get("N")
+        e_i = header.get("E")
+
+        # the checks which are the same for all the rows are resolved before the loop
+        if skip_cubes_without_names and name_i is None:
+            # no cube has a name
+            return
+        has_csv_N_E = n_i is not None and e_i is not None
+        if filter_by_number_of_nodes:
+            min_N, max_N = filter_by_number_of_nodes
+        # the signatures which are repeated in the csv file are processed only once
+        processed_cube_signatures = set()
+
+        for row_k, csv_row in enumerate(csv_reader):
+            cube_signature = csv_row[hexa_i].strip()
+            cube_name = csv_row[name_i].strip() if name_i is not None else ""
+            if not cube_signature or cube_signature in processed_cube_signatures:
                 continue
 
             if skip_cubes_without_names and not cube_name:
                 continue
 
-            try:
-                cube_N = int(csv_row[header["N"]])
-                cube_E = int(csv_row[header["E"]])
-            except (ValueError, KeyError):
-                cube_N = 0
-                cube_E = 0
+            output_filename = (
+                f"{output_filename_prefix}{cube_signature}.{file_extension}"
+            )
+            if not force and path_exists(output_filename):
+                log(" skipping cube %s with existing file\n" % cube_signature)
+                continue
+
+            cube_N = 0
+            cube_E = 0
+            if has_csv_N_E:
+                # the empty values are common, so they are checked without raising exceptions
+                cube_N_text = csv_row[n_i]
+                cube_E_text = csv_row[e_i]
+                if cube_N_text.isdecimal() and cube_E_text.isdecimal():
+                    cube_N = int(cube_N_text)
+                    cube_E = int(cube_E_text)
 
             try:
-                cube = convert_cube_signature_to_bandage_array(cube_signature)
+                cube = convert_cube_signature(cube_signature)
             except ValueError:
-                print(" cube signature error:", cube_signature)
+                log(" cube signature error: %s\n" % cube_signature)
                 continue
 
-            explored_cube = None
-
-            # try to filter based on the csv file information, otherwise explore the cube
-            if cube_N == 0 or cube_E == 0:
-                explored_cube = explore_cube(cube)
-                cube_N, cube_E = len(explored_cube[0]), len(explored_cube[1])
+            remaining_filter_by_number_of_nodes = None
 
             if filter_by_number_of_nodes:
-                min_N, max_N = filter_by_number_of_nodes
-                if cube_N < min_N or cube_N > max_N:
-                    print(
-                        " skipping cube {} with {} nodes".format(cube_signature, cube_N)
-                    )
+                # try to filter based on the csv file information or on the estimated number of nodes,
+                # otherwise the cube is filtered after it is explored
+                if cube_N == 0 or cube_E == 0:
+                    estimated_min_N, estimated_max_N = estimate_N_bounds(cube)
+                    if estimated_min_N > max_N or (
+                        estimated_max_N is not None and estimated_max_N < min_N
+                    ):
+                        log(
+                            " skipping cube %s with %s-%s estimated nodes\n"
+                            % (cube_signature, estimated_min_N, estimated_max_N)
+                        )
+                        continue
+                    remaining_filter_by_number_of_nodes = filter_by_number_of_nodes
+                elif cube_N < min_N or cube_N > max_N:
+                    log(" skipping cube %s with %d nodes\n" % (cube_signature, cube_N))
                     continue
 
-            if not explored_cube:
-                explored_cube = explore_cube(cube)
+            processed_cube_signatures.add(cube_signature)
+            yield (
+                cube,
+                cube_signature,
+                cube_name,
+                row_k,
+                output_filename,
+                remaining_filter_by_number_of_nodes,
+            )
 
-            nodes, edges, edge_labels, _ = explored_cube
 
-            cube_N, cube_E = len(nodes), len(edges)
+def process_csv_cube(
+    cube,
+    cube_signature,
+    cube_name,
+    row_k,
+    output_filename,
+    filter_by_number_of_nodes,
+    skip_legend_draw,
+    cube_draw_projection,
+    explore_cache_directory=None,
+    quiet=False,
+    return_output=False,
+    single_pass_legend_draw=False,
+    output_temporary_folder=None,
+):
+    """
+    Process a cube from the csv file
 
-            print(
-                "Cube:{}  nodes={} edges={} (csv row {}/{})".format(
-                    cube_signature, cube_N, cube_E, row_k, len(csv_list) - 1
+    Args:
+      cube: the bandaged cube in array[27] format
+      cube_signature: the cube signature
+      cube_name: the cube name
+      row_k: the csv row of the cube
+      output_filename: the filename of the generated image
+      filter_by_number_of_nodes: a tuple of (min_nodes, max_nodes), the cube is skipped if its graph has a number of nodes outside this range (None for no filter)
+      skip_legend_draw: skip drawing of the legend
+      cube_draw_projection: the cube projection for drawing
+      explore_cache_directory: the directory of the explored cubes cache (None for no disk cache)
+      quiet: don't print the progress
+      return_output: return the generated image instead of writing it to output_filename
+      single_pass_legend_draw: draw the legend in the same graphviz pass as the graph (see draw_cube_graph)
+      output_temporary_folder: the directory where the temporary files and the graph layouts are kept and reused on the next runs (None for no temporary files)
+
+    Returns:
+      a tuple of (file name, file content) of the generated image if return_output is set, otherwise None
+      None is also returned if the cube is skipped
+    """
+    explored_cube = explore_cube_cached(tuple(cube), explore_cache_directory)
+
+    nodes, edges, edge_labels, _ = explored_cube
+
+    cube_N, cube_E = len(nodes), len(edges)
+
+    if filter_by_number_of_nodes:
+        min_N, max_N = filter_by_number_of_nodes
+        if cube_N < min_N or cube_N > max_N:
+            if not quiet:
+                sys.stdout.write(
+                    " skipping cube %s with %d nodes\n" % (cube_signature, cube_N)
                 )
-            )
+            return None
+
+    if not quiet:
+        sys.stdout.write(
+            "Cube:%s  nodes=%d edges=%d (csv row %d)\n  Output file:  %s\n"
+            % (cube_signature, cube_N, cube_E, row_k, output_filename)
+        )
+
+    cube_label = "{} - {} (N={} E={}) ".format(
+        cube_signature, cube_name, cube_N, cube_E
+    )
 
+    output_name = os.path.basename(output_filename)
+    with contextlib.ExitStack() as exit_stack:
+        if return_output:
+            # every image is drawn in its own directory, because the same cube can be processed by several processes
             output_filename = os.path.join(
-                output_directory, "{}.{}".format(cube_signature, file_extension)
-            )
-            cube_label = "{} - {} (N={} E={}) ".format(
-                cube_signature, cube_name, cube_N, cube_E
+                exit_stack.enter_context(
+                    tempfile.TemporaryDirectory(prefix="bandage_cube_output")
+                ),
+                output_name,
             )
 
-            print("  Output file: ", output_filename)
-            draw_cube_graph(
-                explored_cube,
-                cube_signature,
-                cube_label,
-                output_filename,
-                skip_legend_draw=skip_legend_draw,
-                cube_draw_projection=cube_draw_projection,
+        draw_cube_graph(
+            explored_cube,
+            cube_signature,
+            cube_label,
+            output_filename,
+            skip_legend_draw=skip_legend_draw,
+            output_temporary_folder=output_temporary_folder,
+            cube_draw_projection=cube_draw_projection,
+            single_pass_legend_draw=single_pass_legend_draw,
+        )
+
+        if return_output:
+            with open(output_filename, "rb") as f:
+                return output_name, f.read()
+    return None
+
+
+def process_csv_file(
+    csv_file_name,
+    output_directory,
+    file_extension="png",
+    filter_by_number_of_nodes=None,
+    skip_cubes_without_names=False,
+    skip_legend_draw=False,
+    cube_draw_projection=None,
+    explore_cache_directory=None,
+    force=False,
+    quiet=False,
+    output_archive=None,
+    single_pass_legend_draw=False,
+    output_temporary_folder=None,
+):
+    """
+      process the csv file 
+      It requires an csv file with columns named Hexa
+      Optional columns: Name, N,E
+      The meaning of the rows is:
+          Hexa - cube hex signature
+          Name - cube name
+          N - number of nodes of the graph for cube
+          E - number of edges of the graph for cube
+      
+      Args:
+        csv_file_name: csv file path
+        output_directory: the directory of output files
+        file_extension: the extension and file format (examples: "png", "svg", "pdf")
+        filter_by_number_of_nodes is a tuple of (min_nodes, max_nodes) for skipping processing of the cubes from the csv file
+        skip_cubes_without_names: skip cubes without names
+        skip_legend_draw: skip drawing of the legend for all cubes
+        cube_draw_projection: the cube projection for drawing
+        explore_cache_directory: the directory where the explored cubes are cached between runs (None for no disk cache)
+        force: process the cubes even if their output file exists already
+        quiet: don't print the progress
+        output_archive: if set, the images are written to this zip file instead of the output directory
+        single_pass_legend_draw: draw the legend in the same graphviz pass as the graph (see draw_cube_graph)
+        output_temporary_folder: the directory where the temporary files and the graph layouts are kept and reused on the next runs (None for no temporary files)
+
+      The cubes are processed in parallel, while the csv file is read
+    """
+    with contextlib.ExitStack() as exit_stack:
+        archive = None
+        if output_archive:
+            # the images are returned by the processes and only this process writes the archive
+            archive = exit_stack.enter_context(
+                zipfile.ZipFile(output_archive, "w", zipfile.ZIP_STORED)
             )
+            # the archive is always written from scratch
+            force = True
+        else:
+            os.makedirs(output_directory, exist_ok=True)
+
+        csv_cubes = read_csv_cubes(
+            csv_file_name,
+            output_directory,
+            file_extension,
+            filter_by_number_of_nodes,
+            skip_cubes_without_names,
+            force,
+            quiet,
+        )
+        process_csv_cube_arguments = (
+            skip_legend_draw,
+            cube_draw_projection,
+            explore_cache_directory,
+            quiet,
+            archive is not None,
+            single_pass_legend_draw,
+            output_temporary_folder,
+        )
+
+        def write_to_archive(output):
+            # the skipped cubes have no output
+            if output:
+                archive.writestr(*output)
+
+        run_in_processes(
+            process_csv_cube,
+            (csv_cube + process_csv_cube_arguments for csv_cube in csv_cubes),
+            write_to_archive if archive else None,
+        )
 
 
 def process_single_cube(
-    cube_signature, output_filename, skip_legend_draw, cube_draw_projection
+    cube_signature,
+    output_filename,
+    skip_legend_draw,
+    cube_draw_projection,
+    explore_cache_directory=None,
+    single_pass_legend_draw=False,
+    output_temporary_folder=None,
 ):
     """
     Process a single cube signature
@@ -918,13 +1547,16 @@ def process_single_cube(
        output_filename: the filename of the generated image
        skip_legend_draw: the the legend is not drawn
        cube_draw_projection: the cube projection for drawing
+       explore_cache_directory: the directory of the explored cubes cache (None for no disk cache)
+       single_pass_legend_draw: draw the legend in the same graphviz pass as the graph (see draw_cube_graph)
+       output_temporary_folder: the directory where the temporary files and the graph layouts are kept and reused on the next runs (None for no temporary files)
     """
     try:
         cube = convert_cube_signature_to_bandage_array(cube_signature)
     except ValueError:
         print("hex signature error:", cube_signature)
         return
-    explored_cube = explore_cube(cube)
+    explored_cube = explore_cube_cached(tuple(cube), explore_cache_directory)
     nodes, edges, edge_labels, _ = explored_cube
     cube_N, cube_E = len(nodes), len(edges)
     cube_label = "{} - (N={} E={}) ".format(cube_signature, cube_N, cube_E)
@@ -936,7 +1568,9 @@ def process_single_cube(
         cube_label,
         output_filename,
         skip_legend_draw=skip_legend_draw,
+        output_temporary_folder=output_temporary_folder,
         cube_draw_projection=cube_draw_projection,
+        single_pass_legend_draw=single_pass_legend_draw,
     )
 
 
@@ -946,6 +1580,10 @@ def process_cube_list(
     file_format,
     skip_legend_draw,
     cube_draw_projection,
+    explore_cache_directory=None,
+    force=False,
+    single_pass_legend_draw=False,
+    output_temporary_folder=None,
 ):
     """
     Process a list of cube signature
@@ -955,26 +1593,58 @@ def process_cube_list(
        file_format: the file extension ("png" or "pdf")
        skip_legend_draw: the the legend is not drawn
        cube_draw_projection: the cube projection for drawing
+       explore_cache_directory: the directory where the explored cubes are cached between runs (None for no disk cache)
+       force: process the cubes even if their output file exists already
+       single_pass_legend_draw: draw the legend in the same graphviz pass as the graph (see draw_cube_graph)
+       output_temporary_folder: the directory where the temporary files and the graph layouts are kept and reused on the next runs (None for no temporary files)
     """
     os.makedirs(output_directory, exist_ok=True)
+    cubes = []
+    output_filename_prefix = os.path.join(output_directory, "")
     for cube_signature in cube_signature_list:
-        output_filename = os.path.join(
-            output_directory, "{}.{}".format(cube_signature, file_format)
-        )
+        output_filename = f"{output_filename_prefix}{cube_signature}.{file_format}"
+        if not force and os.path.exists(output_filename):
+            print(
+                "Skipping cube {}, existing file: {}".format(
+                    cube_signature, output_filename
+                )
+            )
+            continue
         print("Processing cube {}, file: {}".format(cube_signature, output_filename))
-        process_single_cube(
-            cube_signature, output_filename, skip_legend_draw, cube_draw_projection
+        cubes.append(
+            (
+                cube_signature,
+                output_filename,
+                skip_legend_draw,
+                cube_draw_projection,
+                explore_cache_directory,
+                single_pass_legend_draw,
+                output_temporary_folder,
+            )
         )
 
+    if len(cubes) == 1:
+        process_single_cube(*cubes[0])
+    elif cubes:
+        run_in_processes(process_single_cube, cubes)
 
-if __name__ == "__main__":
+
+def build_parser():
+    """
+    Build the command line arguments parser
+
+    Returns:
+       the argparse.ArgumentParser
+    """
     parser = argparse.ArgumentParser(
         description="Bandage cube grapher, written by Nasca Octavian Paul http://www.paulnasca.com"
     )
-    parser.add_argument("--output_directory", default=".", help="output directory")
+    parser.add_argument(
+        "--output_directory", default=DEFAULT_OUTPUT_DIRECTORY, help="output directory"
+    )
     parser.add_argument(
         "--file_format",
-        default="png",
+        default=DEFAULT_FILE_FORMAT,
         help='output file format like "png", "pdf" or "svg".',
     )
     parser.add_argument(
@@ -984,9 +1654,16 @@ if __name__ == "__main__":
         help="skip drawing of the legend",
     )
 
+    parser.add_argument(
+        "--single_pass_legend_draw",
+        default=False,
+        action="store_true",
+        help="draw the legend in the same graphviz pass as the graph (faster, but the legend is placed by sfdp)",
+    )
+
     parser.add_argument(
         "--cube_draw_projection",
-        default="cube_map",
+        default=DEFAULT_CUBE_DRAW_PROJECTION,
         choices=["isometric", "cube_map"],
         help="The cube drawing projection.",
     )
@@ -1004,10 +1681,55 @@ if __name__ == "__main__":
         default=None,
         help="process only cubes with number of nodes in range min-max. Example: 100-500  or  0-10000",
     )
+    parser.add_argument(
+        "--force",
+        default=False,
+        action="store_true",
+        help="process the cubes even if their output files exist already",
+    )
+    parser.add_argument(
+        "--output_archive",
+        default=None,
+        help="write the images of the csv file cubes to this zip file instead of the output directory",
+    )
+    parser.add_argument(
+        "--quiet",
+        default=False,
+        action="store_true",
+        help="don't print the progress of the csv file processing",
+    )
+    parser.add_argument(
+        "--explore_cache_directory",
+        default=None,
+        help="directory where the explored cubes are cached and reused on the next runs",
+    )
+    parser.add_argument(
+        "--output_temporary_folder",
+        default=None,
+        help="directory where the temporary files (svg cubes, dot files) and the graph layouts are kept; the layouts are reused on the next runs",
+    )
 
     parser.add_argument("cube_signatures", nargs="*", help="cube hex or array[27] signatures")
+    return parser
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        build_parser().print_usage()
+        sys.exit()
 
-    args = parser.parse_args()
+    if len(sys.argv) == 2 and not sys.argv[1].startswith("-"):
+        # a single cube with the default arguments doesn't need the arguments parser
+        process_cube_list(
+            [sys.argv[1]],
+            DEFAULT_OUTPUT_DIRECTORY,
+            DEFAULT_FILE_FORMAT,
+            False,
+            DEFAULT_CUBE_DRAW_PROJECTION,
+        )
+        sys.exit()
+
+    args = build_parser().parse_args()
 
     if args.cube_signatures:
         process_cube_list(
@@ -1016,9 +1738,14 @@ if __name__ == "__main__":
             args.file_format,
             args.skip_legend_draw,
             args.cube_draw_projection,
+            args.explore_cache_directory,
+            args.force,
+            args.single_pass_legend_draw,
+            args.output_temporary_folder,
         )
     if args.process_csv_file:
-        print("Processing csv file", args.process_csv_file)
+        if not args.quiet:
+            print("Processing csv file", args.process_csv_file)
         filter_by_number_of_nodes = None
         if args.filter_by_number_of_nodes:
             filter_by_number_of_nodes = [
@@ -1033,6 +1760,10 @@ if __name__ == "__main__":
             args.skip_cubes_without_names,
             args.skip_legend_draw,
             args.cube_draw_projection,
+            args.explore_cache_directory,
+            args.force,
+            args.quiet,
+            args.output_archive,
+            args.single_pass_legend_draw,
+            args.output_temporary_folder,
         )
-    if len(sys.argv) < 2:
-        parser.print_usage()